@@ -1,4 +1,4 @@
-from .builder import PageBuilder, serve
+from .builder import PageBuilder, SafeStr, serve
 from .cli_s import cli
 
-__all__ = ['PageBuilder', 'serve', 'cli']
+__all__ = ['PageBuilder', 'SafeStr', 'serve', 'cli']
@@ -1,22 +1,144 @@
 import functools
+import hashlib
+import html
 import http.server
+import itertools
+import json
 import logging
+import os
+import pickle
 import shutil
-from collections.abc import Callable
+import sys
+import types
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from os import PathLike
 from pathlib import Path
 from typing import Any, Self
 
 import combustache
 import yaml
-from watchdog.observers import Observer
 
-from .watcher import AssetHandler, PagesHandler, TemplateHandler
+from .__version__ import __version__
+from .utils import (
+    copy_asset,
+    has_content,
+    scan_files,
+    scan_tree,
+    write_file,
+)
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 type StrPath = PathLike[str] | str
 
 logger = logging.getLogger('pagebuilder')
 
+MANIFEST_NAME = '.manifest.json'
+DATA_CACHE_NAME = 'data.pickle'
+SLOT_SENTINEL = '\0<pagebuilder-slot>\0'
+IO_WORKERS = 16
+
+
+# NOTE: templates are shared between many pages, so we tokenize each
+# distinct template text once and reuse the parsed form on every render
+@functools.lru_cache(maxsize=1024)
+def _compile(template: str) -> combustache.Template:
+    return combustache.Template(template)
+
+
+# NOTE: strings marked as safe (e.g. the rendered slot) are put in as is
+class SafeStr(str):
+    pass
+
+
+@functools.lru_cache(maxsize=4096)
+def _html_escape(string: str) -> str:
+    return html.escape(string)
+
+
+def _escape(string: str) -> str:
+    if isinstance(string, SafeStr):
+        return string
+    return _html_escape(string)
+
+
+def _stringify(value: Any) -> str:
+    if value is None:
+        return ''
+    # str() would turn a SafeStr back into a plain str
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _render(template: str, data: dict[str, Any]) -> str:
+    # NOTE: every mustache tag (delimiter changes included) starts with '{{',
+    # so text without it renders to itself
+    if '{{' not in template:
+        return template
+    return _compile(template).render(
+        data, stringify=_stringify, escape=_escape
+    )
+
+
+# NOTE: plain string joins here, every intermediate Path object costs
+# a parse, and the watcher loads the same few paths over and over
+@functools.lru_cache(maxsize=8192)
+def _output_location(
+    dist_path: Path, relative_path: Path, ext: str
+) -> tuple[str, Path]:
+    output_dir, file_name = os.path.split(relative_path)
+    name = file_name.removesuffix(ext)
+    if name != 'index':
+        output_dir = os.path.join(output_dir, name)
+    return name, Path(dist_path, output_dir, 'index.html')
+
+
+def _render_func_id(func: Callable[..., Any]) -> str:
+    # NOTE: repr has a memory address in it for most objects, and the name
+    # alone stays the same when the body of the function changes
+    if isinstance(func, functools.partial):
+        return (
+            f'functools.partial({_render_func_id(func.func)}, '
+            f'{func.args!r}, {func.keywords!r})'
+        )
+    named = func if hasattr(func, '__qualname__') else type(func)
+    name = f'{getattr(named, "__module__", None)}.{named.__qualname__}'
+    code = getattr(func, '__code__', None) or getattr(
+        type(func).__call__, '__code__', None
+    )
+    if not isinstance(code, types.CodeType):
+        return name
+    hash = hashlib.blake2b(digest_size=16)
+    _hash_code(code, hash)
+    return f'{name}:{hash.hexdigest()}'
+
+
+def _hash_code(code: types.CodeType, hash: 'hashlib._Hash') -> None:
+    hash.update(code.co_code)
+    hash.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        # the repr of a nested code object has its address in it
+        if isinstance(const, types.CodeType):
+            _hash_code(const, hash)
+        else:
+            hash.update(_const_repr(const).encode())
+
+
+def _const_repr(const: object) -> str:
+    # NOTE: frozenset iteration order follows string hashes,
+    # which are randomized per process
+    if isinstance(const, frozenset):
+        return f'frozenset({sorted(_const_repr(item) for item in const)!r})'
+    if isinstance(const, tuple):
+        return f'({", ".join(_const_repr(item) for item in const)},)'
+    return repr(const)
+
 
 class PageBuilder:
     def __init__(
@@ -31,6 +153,9 @@ class PageBuilder:
         data_end: str = '---\n',
         shared_data: dict[str, Any] | None = None,
         render_func: Callable[[str, dict[str, Any]], str] | None = None,
+        workers: int | None = 1,
+        link_assets: bool = False,
+        cache_dir: StrPath | None = None,
     ) -> None:
         self.pages_path = Path(pages_path)
         self.templates_path = Path(templates_path)
@@ -41,55 +166,469 @@ class PageBuilder:
         self.data_start = data_start
         self.data_end = data_end
         self.shared_data = shared_data or {}
-        self.render_func = render_func or combustache.render
-
+        self.render_func = render_func or _render
+        self.workers = workers or os.cpu_count() or 1
+        self.link_assets = link_assets
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._known_dirs: set[Path] = set()
+        self._page_digests: dict[Path, str] = {}
+        self._data_cache = self._load_data_cache()
+        self._data_cache_used: set[bytes] = set()
+        self._data_cache_dirty = False
+
+        self._template_chains: dict[str, tuple[str, ...]] = {}
+        self._chain_data: dict[tuple[str, ...], dict[str, Any]] = {}
+        self._slot_splits: dict[
+            tuple[str, tuple[str, ...]], tuple[str, str] | None
+        ] = {}
         self.templates: dict[str, Page] = {}
-        for template_path in self.templates_path.rglob(f'**/*{self.ext}'):
-            self.add_template(template_path)
+        for entry in scan_files(self.templates_path, self.ext):
+            self.add_template(Path(entry.path))
 
         self.pages: dict[Path, Page] = {}
-        for page_path in self.pages_path.rglob(f'**/*{self.ext}'):
-            self.add_page(page_path)
+        # NOTE: the watcher needs to know which pages use a template,
+        # so we keep the reverse of the template stacks here
+        self.pages_by_template: defaultdict[str, set[Path]] = defaultdict(set)
+        for entry in scan_files(self.pages_path, self.ext):
+            self.add_page(Path(entry.path))
 
     def add_page(self, page_path: Path) -> 'Page':
+        old_page = self.pages.get(page_path)
+        if old_page and old_page.is_source_unchanged():
+            logger.debug(f'page source unchanged; skipping: {page_path}')
+            return old_page
         page = Page.load(page_path, self.pages_path, self)
+        page.template_stack = page.make_template_stack()
+        if page_path in self.pages:
+            self.remove_page(page_path)
         self.pages[page_path] = page
+        for template_name in page.template_stack:
+            self.pages_by_template[template_name].add(page_path)
+        return page
+
+    def remove_page(self, page_path: Path) -> 'Page':
+        page = self.pages.pop(page_path)
+        for template_name in page.template_stack:
+            self.pages_by_template[template_name].discard(page_path)
+        return page
+
+    def move_page(self, src_path: Path, dest_path: Path) -> 'Page':
+        old_page = self.pages.get(src_path)
+        if old_page:
+            self.remove_page(src_path)
+        try:
+            page = self.add_page(dest_path)
+        except Exception:
+            if old_page:
+                old_page.save_path.unlink(missing_ok=True)
+            raise
+        if old_page is None or old_page.save_path == page.save_path:
+            return page
+
+        # NOTE: the page path isn't a part of the render data, so a page
+        # that was only moved renders the same and we move its output
+        digest = self._page_digests.pop(old_page.save_path, None)
+        if digest == page.digest():
+            self.make_dir(page.save_path.parent)
+            try:
+                os.replace(old_page.save_path, page.save_path)
+                self._page_digests[page.save_path] = digest
+                return page
+            except FileNotFoundError:
+                pass
+        old_page.save_path.unlink(missing_ok=True)
         return page
 
+    def refresh_template_stack(self, page_path: Path) -> None:
+        page = self.pages[page_path]
+        template_stack = page.make_template_stack()
+        for template_name in page.template_stack:
+            self.pages_by_template[template_name].discard(page_path)
+        page.template_stack = template_stack
+        for template_name in page.template_stack:
+            self.pages_by_template[template_name].add(page_path)
+
     def add_template(self, template_path: Path) -> 'Page':
+        name = template_path.name.removesuffix(self.ext)
+        old_template = self.templates.get(name)
+        if (
+            old_template
+            and old_template.source_path == template_path
+            and old_template.is_source_unchanged()
+        ):
+            logger.debug(
+                f'template source unchanged; skipping: {template_path}'
+            )
+            return old_template
         template = Page.load(template_path, self.templates_path, self)
+        if self.render_func is _render:
+            # parse templates up front so every page render hits the cache
+            # and syntax errors surface when the template is loaded
+            _compile(template.content)
         self.templates[template.name] = template
+        self._template_chains.clear()
+        self._chain_data.clear()
+        self._slot_splits.clear()
+        return template
+
+    def remove_template(self, name: str) -> 'Page':
+        template = self.templates.pop(name)
+        self._template_chains.clear()
+        self._chain_data.clear()
+        self._slot_splits.clear()
         return template
 
+    def get_template_chain(self, template_name: str) -> tuple[str, ...]:
+        # NOTE: pages share a handful of templates, so each chain is
+        # walked once and not once for every page using it
+        if template_name not in self._template_chains:
+            template_chain: list[str] = []
+            curr_name = template_name
+            while curr_name:
+                if curr_name not in self.templates:
+                    raise KeyError(f"template doesn't exist: {curr_name}")
+                template_chain.append(curr_name)
+                curr_name = self.templates[curr_name].data.get('template')
+            self._template_chains[template_name] = tuple(template_chain)
+        return self._template_chains[template_name]
+
+    def parse_data(self, data_txt: bytes) -> Any:
+        if self._data_cache is None:
+            return yaml.load(data_txt, YamlLoader)
+        # NOTE: we keep the pickled data and unpickle it every time
+        # so pages with the same front matter don't share one dict
+        key = hashlib.blake2b(data_txt, digest_size=16).digest()
+        self._data_cache_used.add(key)
+        if key in self._data_cache:
+            return pickle.loads(self._data_cache[key])
+        data = yaml.load(data_txt, YamlLoader)
+        self._data_cache[key] = pickle.dumps(data)
+        self._data_cache_dirty = True
+        return data
+
+    def _load_data_cache(self) -> dict[bytes, bytes] | None:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.cache_dir / DATA_CACHE_NAME, 'rb') as file:
+                data_cache = pickle.load(file)
+        # NOTE: a broken cache file can raise almost anything while
+        # unpickling, and a cache must never be the reason a build fails
+        except Exception:
+            return {}
+        if not isinstance(data_cache, dict) or not all(
+            isinstance(key, bytes) and isinstance(value, bytes)
+            for key, value in data_cache.items()
+        ):
+            return {}
+        return data_cache
+
+    def _save_data_cache(self) -> None:
+        if self._data_cache is None or self.cache_dir is None:
+            return
+        # drop the front matter nothing uses anymore
+        if self._data_cache.keys() != self._data_cache_used:
+            self._data_cache = {
+                key: self._data_cache[key] for key in self._data_cache_used
+            }
+            self._data_cache_dirty = True
+        if not self._data_cache_dirty:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_dir / f'{DATA_CACHE_NAME}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(self._data_cache, file)
+        os.replace(tmp_path, self.cache_dir / DATA_CACHE_NAME)
+        self._data_cache_dirty = False
+
+    def make_dir(self, path: Path, *, force: bool = False) -> None:
+        # NOTE: many pages share an output directory,
+        # so we only ask the filesystem about each directory once;
+        # force is for when it was removed behind our back
+        if force or path not in self._known_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._known_dirs.add(path)
+
+    def get_chain_data(
+        self, template_stack: tuple[str, ...]
+    ) -> dict[str, Any]:
+        # NOTE: template data only changes through add_template,
+        # so the merged data of a template chain can be reused between pages
+        if template_stack not in self._chain_data:
+            data: dict[str, Any] = {}
+            for template_name in template_stack:
+                data = self.templates[template_name].data | data
+            self._chain_data[template_stack] = data
+        return self._chain_data[template_stack]
+
+    def get_slot_split(
+        self, template: 'Page', template_stack: tuple[str, ...]
+    ) -> tuple[str, str] | None:
+        # NOTE: if a template only depends on the template data and the slot
+        # we render it once per template chain and split it at the slot,
+        # pages then just get put between the two halves
+        key = (template.name, template_stack)
+        if key not in self._slot_splits:
+            data = self.get_chain_data(template_stack) | {
+                'slot': SafeStr(SLOT_SENTINEL)
+            }
+            split = None
+            if not any(callable(value) for value in data.values()):
+                rendered = self.render_func(template.content, data)
+                # an escaped or repeated slot can't be split
+                if rendered.count(SLOT_SENTINEL) == 1:
+                    prefix, _, suffix = rendered.partition(SLOT_SENTINEL)
+                    split = (prefix, suffix)
+            self._slot_splits[key] = split
+        return self._slot_splits[key]
+
     def build(self) -> None:
-        shutil.rmtree(self.dist_path, ignore_errors=True)
-        for page in self.pages.values():
-            page.save()
-        if self.assets_path:
-            shutil.copytree(
-                self.assets_path, self.dist_path, dirs_exist_ok=True
-            )
+        # directories could have been removed since the last build
+        self._known_dirs.clear()
+        manifest = self._load_manifest()
+        if manifest is None:
+            shutil.rmtree(self.dist_path, ignore_errors=True)
+            manifest = {'pages': {}, 'assets': {}}
+        new_manifest: dict[str, dict[str, Any]] = {
+            'config': self._manifest_config(),
+            'pages': {},
+            'assets': {},
+        }
+
+        # NOTE: a page is only rendered again if its content, data,
+        # templates or the shared data changed since the last build
+        changed_pages: dict[Path, Page] = {}
+        page_digests: dict[Path, str] = {}
+        for page_path, page in self.pages.items():
+            key = page.save_path.relative_to(self.dist_path).as_posix()
+            digest = page.digest()
+            new_manifest['pages'][key] = digest
+            page_digests[page.save_path] = digest
+            if (
+                manifest['pages'].get(key) != digest
+                or not page.save_path.exists()
+            ):
+                changed_pages[page_path] = page
+
+        # create all output directories up front, shallow ones first,
+        # so the writer threads below never have to
+        for dir_path in sorted(
+            {page.save_path.parent for page in changed_pages.values()},
+            key=lambda dir_path: len(dir_path.parts),
+        ):
+            self.make_dir(dir_path)
+
+        # NOTE: writes and copies release the GIL,
+        # so we let them overlap with rendering and with each other
+        with ThreadPoolExecutor(IO_WORKERS) as io_executor:
+            writes: list[Future[None]] = [
+                io_executor.submit(page.write, txt)
+                for page, txt in self._render_pages(changed_pages)
+            ]
+
+            # NOTE: like shutil.copytree, symlinked asset directories
+            # are copied as directories and empty ones are kept
+            asset_dirs: set[Path] = set()
+            if self.assets_path:
+                for entry in scan_tree(self.assets_path, follow_symlinks=True):
+                    asset_path = Path(entry.path)
+                    rel_path = asset_path.relative_to(self.assets_path)
+                    real_path = self.dist_path / rel_path
+                    if entry.is_dir():
+                        asset_dirs.add(real_path)
+                        self.make_dir(real_path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    signature = [stat.st_mtime_ns, stat.st_size]
+                    key = rel_path.as_posix()
+                    # NOTE: pages and assets are written at the same time,
+                    # so when both claim an output the page wins every time
+                    if key in new_manifest['pages']:
+                        logger.warning(
+                            'asset has the same output as a page; '
+                            f'skipping: {asset_path}'
+                        )
+                        continue
+                    new_manifest['assets'][key] = signature
+                    if (
+                        manifest['assets'].get(key) != signature
+                        or not real_path.exists()
+                    ):
+                        self.make_dir(real_path.parent)
+                        writes.append(
+                            io_executor.submit(
+                                copy_asset,
+                                asset_path,
+                                real_path,
+                                link=self.link_assets,
+                            )
+                        )
+
+            for write in writes:
+                write.result()
+        self._page_digests = page_digests
+
+        old_outputs = manifest['pages'].keys() | manifest['assets'].keys()
+        new_outputs = (
+            new_manifest['pages'].keys() | new_manifest['assets'].keys()
+        )
+        for key in old_outputs - new_outputs:
+            output_path = self.dist_path / key
+            output_path.unlink(missing_ok=True)
+            logger.debug(f'stale output removed: {key}')
+            # NOTE: a directory left behind would be served as a listing
+            for parent in output_path.parents:
+                if parent == self.dist_path or parent in asset_dirs:
+                    break
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                self._known_dirs.discard(parent)
+
+        self.dist_path.mkdir(parents=True, exist_ok=True)
+        (self.dist_path / MANIFEST_NAME).write_text(json.dumps(new_manifest))
+        self._save_data_cache()
+
+    def _load_manifest(self) -> dict[str, dict[str, Any]] | None:
+        try:
+            manifest = json.loads((self.dist_path / MANIFEST_NAME).read_text())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict):
+            return None
+        if manifest.keys() != {'config', 'pages', 'assets'}:
+            return None
+        # NOTE: a different renderer or pagebuilder version can render
+        # the same sources differently, so everything has to be rebuilt
+        if manifest['config'] != self._manifest_config():
+            return None
+        return manifest
+
+    def _manifest_config(self) -> dict[str, str]:
+        return {
+            'version': __version__,
+            'render_func': _render_func_id(self.render_func),
+        }
+
+    def save_pages(self, page_paths: Iterable[Path]) -> None:
+        # NOTE: the watcher version of the page part of build(),
+        # a template edit can touch most of the site
+        changed_pages: dict[Path, Page] = {}
+        page_digests: dict[Path, str] = {}
+        for page_path in page_paths:
+            page = self.pages[page_path]
+            digest = page.digest()
+            if (
+                self._page_digests.get(page.save_path) == digest
+                and page.save_path.exists()
+            ):
+                logger.debug(f'page unchanged: {page.save_path}')
+                continue
+            changed_pages[page_path] = page
+            page_digests[page.save_path] = digest
+
+        with ThreadPoolExecutor(IO_WORKERS) as io_executor:
+            writes: list[Future[None]] = [
+                io_executor.submit(page.write, txt)
+                for page, txt in self._render_pages(changed_pages)
+            ]
+            for write in writes:
+                write.result()
+        self._page_digests.update(page_digests)
+
+    def _render_pages(
+        self, pages: dict[Path, 'Page']
+    ) -> Iterator[tuple['Page', str]]:
+        if self.workers == 1 or len(pages) < 2:
+            for page in pages.values():
+                yield page, page.render()
+            return
+
+        # NOTE: page renders are independent of each other, so we render
+        # them in worker processes (combustache is pure python and holds
+        # the GIL) and only do the writes here in the main process
+        chunksize = max(1, len(pages) // (4 * self.workers))
+        with ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=(self,)
+        ) as executor:
+            rendered = executor.map(_render_page, pages, chunksize=chunksize)
+            yield from zip(pages.values(), rendered)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # NOTE: workers only render, so we leave out the watcher
+        # and the build bookkeeping to keep the pickled builder small
+        state = self.__dict__.copy()
+        for name in (
+            '_observer',
+            '_handlers',
+            '_known_dirs',
+            '_page_digests',
+            '_data_cache',
+            '_data_cache_used',
+        ):
+            state.pop(name, None)
+        return state
 
     def observe(self) -> None:
+        # NOTE: watchdog is only needed in watcher mode,
+        # plain builds don't have to pay for importing it
+        from watchdog.observers import Observer
+        from watchdog.observers.polling import PollingObserver
+
+        from .watcher import (
+            INOTIFY_WATCHED_EVENTS,
+            WATCHED_EVENTS,
+            AssetHandler,
+            PagesHandler,
+            TemplateHandler,
+            WatcherFileSystemEventHandler,
+        )
+
         self.build()
 
         self._observer = Observer()
+        # NOTE: watchdog silently falls back to polling when the native
+        # backend can't be loaded, polling rescans the whole tree every second
+        if isinstance(self._observer, PollingObserver):
+            logger.warning(
+                'native file system events are unavailable, falling back to '
+                'polling; on linux check that inotify is available and that '
+                'fs.inotify.max_user_instances is not exhausted'
+            )
+            event_filter = WATCHED_EVENTS
+        elif sys.platform == 'linux':
+            event_filter = INOTIFY_WATCHED_EVENTS
+        else:
+            event_filter = WATCHED_EVENTS
 
-        self._observer.schedule(
+        # NOTE: the handlers run their own threads,
+        # so we keep them around to stop them with the observer
+        self._handlers: list[WatcherFileSystemEventHandler] = [
             PagesHandler(self),
+            TemplateHandler(self),
+        ]
+        self._observer.schedule(
+            self._handlers[0],
             str(self.pages_path),
             recursive=True,
+            event_filter=event_filter,
         )
         self._observer.schedule(
-            TemplateHandler(self),
+            self._handlers[1],
             str(self.templates_path),
             recursive=True,
+            event_filter=event_filter,
         )
         if self.assets_path:
+            self._handlers.append(AssetHandler(self))
             self._observer.schedule(
-                AssetHandler(self),
+                self._handlers[2],
                 str(self.assets_path),
                 recursive=True,
+                event_filter=event_filter,
             )
 
         self._observer.start()
@@ -97,6 +636,9 @@ class PageBuilder:
     def stop_observing(self) -> None:
         self._observer.stop()
         self._observer.join()
+        for handler in self._handlers:
+            handler.stop()
+        self._handlers.clear()
 
     def __enter__(self) -> Self:
         self.observe()
@@ -118,43 +660,121 @@ class Page:
         self.data = data
         self.builder = builder
         self.relative_path = path
-        self.name = self.relative_path.name.removesuffix(self.builder.ext)
-        self.template_stack: list[str] = []
-
-        curr = self
-        while True:
-            template_name = curr.data.get('template', None)
-            if not template_name:
-                break
-            if template_name not in self.builder.templates:
-                raise KeyError(f"template doesn't exist: {template_name}")
-            self.template_stack.append(template_name)
-            curr = self.builder.templates[template_name]
-
-        output_dir_path = self.builder.dist_path / self.relative_path.parent
-        if self.name != 'index':
-            output_dir_path /= self.name
-        self.save_path = output_dir_path / 'index.html'
+        self.name, self.save_path = _output_location(
+            self.builder.dist_path, self.relative_path, self.builder.ext
+        )
+        # NOTE: only pages get a template stack, templates can extend
+        # templates that haven't been loaded yet
+        self.template_stack: tuple[str, ...] = ()
+        self.source_path: Path | None = None
+        self.source_signature: tuple[int, int] | None = None
+        self.source_digest = b''
+
+    def is_source_unchanged(self) -> bool:
+        # NOTE: editors and formatters often rewrite a file with the same
+        # bytes, the stat rules out most real changes without a read
+        if self.source_path is None:
+            return False
+        try:
+            stat = self.source_path.stat()
+        except OSError:
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.source_signature:
+            return True
+        if self.source_signature and stat.st_size != self.source_signature[1]:
+            return False
+        raw = self.source_path.read_bytes()
+        if hashlib.blake2b(raw, digest_size=16).digest() != self.source_digest:
+            return False
+        self.source_signature = signature
+        return True
+
+    def make_template_stack(self) -> tuple[str, ...]:
+        template_name = self.data.get('template', None)
+        if not template_name:
+            return ()
+        return self.builder.get_template_chain(template_name)
 
     def render(self) -> str:
-        # NOTE: we merge the builder shared data here so we can freely
-        # modify it whenever we please by hooks or any other means
-        data = self.builder.shared_data | self.data
+        templates: list[Page] = []
         for template_name in self.template_stack:
-            if template_name not in self.builder.templates:
+            template = self.builder.templates.get(template_name)
+            if template is None:
                 raise KeyError(f"template doesn't exist: {template_name}")
-            template = self.builder.templates[template_name]
-            data = template.data | data
-
-        data['slot'] = self.builder.render_func(self.content, data)
-        for template_name in self.template_stack:
-            template = self.builder.templates[template_name]
-            data['slot'] = self.builder.render_func(template.content, data)
-        return data['slot']
+            templates.append(template)
+        # NOTE: we merge the builder shared data here so we can freely
+        # modify it whenever we please by hooks or any other means
+        data = self.builder.get_chain_data(self.template_stack).copy()
+        data.update(self.builder.shared_data)
+        data.update(self.data)
+
+        data['slot'] = SafeStr(self.builder.render_func(self.content, data))
+        for template in templates:
+            split = None
+            # NOTE: only a mustache template shows every key it uses in its
+            # text, a custom render_func can read anything from the data;
+            # mustache only looks up string keys, other keys can't be used;
+            # the split is rendered with a truthy slot, so an empty slot
+            # could take another branch of a {{#slot}} or {{^slot}} section
+            if (
+                data['slot']
+                and self.builder.render_func is _render
+                and not any(
+                    key in template.content
+                    for key in itertools.chain(
+                        self.builder.shared_data, self.data
+                    )
+                    if isinstance(key, str) and key != 'slot'
+                )
+            ):
+                split = self.builder.get_slot_split(
+                    template, self.template_stack
+                )
+            if split:
+                slot = split[0] + data['slot'] + split[1]
+            else:
+                slot = self.builder.render_func(template.content, data)
+            data['slot'] = SafeStr(slot)
+        return str(data['slot'])
+
+    def digest(self) -> str:
+        hash = hashlib.blake2b(digest_size=16)
+        hash.update(repr(self.builder.shared_data).encode())
+        for page in (
+            self,
+            *(self.builder.templates[name] for name in self.template_stack),
+        ):
+            hash.update(page.content.encode())
+            hash.update(repr(page.data).encode())
+        return hash.hexdigest()
 
     def save(self) -> None:
-        self.save_path.parent.mkdir(parents=True, exist_ok=True)
-        self.save_path.write_text(self.render())
+        # NOTE: the watcher saves every page using a changed template,
+        # pages that would render exactly the same are left alone
+        digest = self.digest()
+        if (
+            self.builder._page_digests.get(self.save_path) == digest
+            and self.save_path.exists()
+        ):
+            logger.debug(f'page unchanged: {self.save_path}')
+            return
+        self.write(self.render())
+        self.builder._page_digests[self.save_path] = digest
+
+    def write(self, txt: str) -> None:
+        data = txt.encode()
+        # NOTE: a rerendered page often comes out the same, leaving the file
+        # alone keeps its mtime so servers and browsers don't reload it
+        if has_content(self.save_path, data):
+            logger.debug(f'page output unchanged; skipping: {self.save_path}')
+            return
+        self.builder.make_dir(self.save_path.parent)
+        try:
+            write_file(self.save_path, data)
+        except FileNotFoundError:
+            self.builder.make_dir(self.save_path.parent, force=True)
+            write_file(self.save_path, data)
         logger.info(f'page saved: {self.save_path}')
 
     @classmethod
@@ -165,26 +785,60 @@ class Page:
         builder: PageBuilder,
     ) -> Self:
         rel_path = path.relative_to(relative_to)
-        raw_txt = path.read_text()
-
-        if raw_txt.startswith(builder.data_start):
-            data_start = len(builder.data_start)
-            data_end = raw_txt.find(builder.data_end, data_start)
-            txt_start = data_end + len(builder.data_end)
-
-            data_txt = raw_txt[data_start:data_end]
-            data = yaml.load(data_txt, yaml.Loader)
+        # NOTE: we split the front matter on bytes and only decode the body,
+        # the yaml parser is happy to take bytes as they are
+        stat = path.stat()
+        raw = path.read_bytes()
+        source_digest = hashlib.blake2b(raw, digest_size=16).digest()
+        if b'\r' in raw:
+            # keep the universal newlines behaviour of read_text
+            raw = raw.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        data_start_marker = builder.data_start.encode()
+        data_end_marker = builder.data_end.encode()
+
+        data_end = -1
+        if raw.startswith(data_start_marker):
+            data_end = raw.find(data_end_marker, len(data_start_marker))
+            if data_end == -1:
+                logger.debug(f'page data is not closed; skipping: {path}')
+
+        if data_end != -1:
+            data_start = len(data_start_marker)
+            txt_start = data_end + len(data_end_marker)
+
+            data_txt = raw[data_start:data_end]
+            # NOTE: the 'template' key lives in the data and is needed
+            # right away to build the template stack, so the data can't be
+            # parsed lazily; we can still skip the parser for empty blocks
+            data = builder.parse_data(data_txt) if data_txt.strip() else {}
             if not isinstance(data, dict):
                 logger.debug(
                     f'page data is not a dictionary; skipping: {path}; {data}'
                 )
                 data = {}
-            txt = raw_txt[txt_start:]
+            txt = raw[txt_start:].decode()
         else:
             data = {}
-            txt = raw_txt
+            txt = raw.decode()
+
+        page = cls(txt, data, rel_path, builder)
+        page.source_path = path
+        page.source_signature = (stat.st_mtime_ns, stat.st_size)
+        page.source_digest = source_digest
+        return page
+
+
+_worker_builder: PageBuilder | None = None
 
-        return cls(txt, data, rel_path, builder)
+
+def _init_worker(builder: PageBuilder) -> None:
+    global _worker_builder
+    _worker_builder = builder
+
+
+def _render_page(page_path: Path) -> str:
+    assert _worker_builder is not None
+    return _worker_builder.pages[page_path].render()
 
 
 http_logger = logging.getLogger('pagebuilder.http')
@@ -195,6 +849,12 @@ class LoggingHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         message = (format % args).translate(self._control_char_table)  # pyright: ignore[reportAttributeAccessIssue]
         http_logger.debug(message)
 
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        # NOTE: sendfile keeps the file data in the kernel,
+        # socket.sendfile falls back to plain sends for in memory files
+        outputfile.flush()
+        self.connection.sendfile(source)
+
 
 def serve(addr: str, port: int, directory: StrPath) -> None:
     MyHandler = functools.partial(
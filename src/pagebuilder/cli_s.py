@@ -1,6 +1,6 @@
 import importlib
 import logging
-from argparse import ArgumentParser, Namespace
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
 from collections.abc import Iterable, Sequence
 from pathlib import Path
 
@@ -8,6 +8,13 @@ from .__version__ import __version__
 from .builder import PageBuilder, serve
 
 
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise ArgumentTypeError(f'should not be negative: {number}')
+    return number
+
+
 def make_cli_parser() -> ArgumentParser:
     parser = ArgumentParser()
 
@@ -83,6 +90,18 @@ def make_pagebuilder_cli_parser() -> ArgumentParser:
         """,
     )
 
+    parser.add_argument(
+        '-j',
+        '--workers',
+        metavar='N',
+        type=non_negative_int,
+        default=None,
+        help="""
+        number of processes to render pages with
+        (only with --args, 0 for one per core, defaults to 1)
+        """,
+    )
+
     builder_select_group.add_argument(
         '-b',
         '--builder',
@@ -107,6 +126,11 @@ def setup_logging(args: Namespace) -> None:
 def get_builders_from_args(args: Namespace) -> list[PageBuilder]:
     builders: list[PageBuilder] = []
     if args.builder:
+        if args.workers is not None:
+            raise ValueError(
+                '--workers only applies to --args, '
+                'pass workers to the builder instances instead'
+            )
         for builder_path in args.builder:
             import_path, _, builder_name = builder_path.partition(':')
             module = importlib.import_module(import_path)
@@ -145,7 +169,8 @@ def get_builders_from_args(args: Namespace) -> list[PageBuilder]:
         if 'assets_path' in kwargs and kwargs['assets_path'].lower() == 'none':
             kwargs['assets_path'] = None
 
-        builder = PageBuilder(**kwargs)
+        workers = 1 if args.workers is None else args.workers
+        builder = PageBuilder(**kwargs, workers=workers or None)
         builders.append(builder)
 
     return builders
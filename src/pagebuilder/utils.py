@@ -0,0 +1,155 @@
+import contextlib
+import os
+import shutil
+import sys
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+if sys.platform == 'linux':
+    import fcntl
+
+COPY_CHUNK_SIZE = 1 << 30
+
+
+def copy_asset(
+    asset_path: Path, real_path: Path, *, link: bool = False
+) -> None:
+    try:
+        same_file = real_path.samefile(asset_path)
+    except FileNotFoundError:
+        same_file = False
+
+    if link and same_file:
+        return
+    # NOTE: the old output has the mode of the asset, so a read only one
+    # can't be opened for writing, and copying over a hard link would
+    # copy the file onto itself
+    real_path.unlink(missing_ok=True)
+    if link:
+        try:
+            os.link(asset_path, real_path)
+            return
+        # NOTE: cross-device links or a filesystem without hard links,
+        # we just copy the file in that case
+        except OSError:
+            pass
+    copy_file(asset_path, real_path)
+    # NOTE: shutil.copystat also copies the extended attributes,
+    # which costs a few syscalls per file and the output doesn't need
+    stat = asset_path.stat()
+    os.utime(real_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.chmod(real_path, stat.st_mode & 0o7777)
+
+
+def is_same_file_state(asset_path: Path, real_path: Path) -> bool:
+    # NOTE: copy_asset keeps the mtime of the asset on the copy,
+    # so a copy that is still current has the same mtime and size
+    try:
+        asset_stat = asset_path.stat()
+        real_stat = real_path.stat()
+    except FileNotFoundError:
+        return False
+    return (
+        asset_stat.st_mtime_ns == real_stat.st_mtime_ns
+        and asset_stat.st_size == real_stat.st_size
+    )
+
+
+def copy_file(src: Path, dst: Path) -> None:
+    # NOTE: shutil.copyfile already uses sendfile on linux and fcopyfile
+    # on macos, we only try the cheaper kernel copies before it
+    if sys.platform == 'linux':
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            try:
+                if _copy_in_kernel(src_fd, dst_fd):
+                    return
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+    shutil.copyfile(src, dst)
+
+
+def _copy_in_kernel(src_fd: int, dst_fd: int) -> bool:
+    # NOTE: a reflink shares the data blocks on copy-on-write filesystems
+    # (btrfs, xfs), copy_file_range at least keeps the copy in the kernel
+    if sys.platform != 'linux':
+        return False
+    try:
+        fcntl.ioctl(dst_fd, fcntl.FICLONE, src_fd)
+        return True
+    except OSError:
+        pass
+    try:
+        while os.copy_file_range(src_fd, dst_fd, COPY_CHUNK_SIZE):
+            pass
+    except OSError:
+        return False
+    return True
+
+
+def scan_files(root: Path, ext: str = '') -> Iterator[os.DirEntry[str]]:
+    for entry in scan_tree(root):
+        if entry.name.endswith(ext) and entry.is_file():
+            yield entry
+
+
+def scan_tree(
+    root: Path, *, follow_symlinks: bool = False
+) -> Iterator[os.DirEntry[str]]:
+    # NOTE: DirEntry caches its stat results,
+    # so callers can use entry.stat() without another syscall
+    dirs = [str(root)]
+    # a symlinked directory can point back up the tree,
+    # so every directory is only walked once
+    root_stat = os.stat(root)
+    seen = {(root_stat.st_dev, root_stat.st_ino)}
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if follow_symlinks:
+                        stat = entry.stat()
+                        if (stat.st_dev, stat.st_ino) in seen:
+                            continue
+                        seen.add((stat.st_dev, stat.st_ino))
+                    dirs.append(entry.path)
+                yield entry
+
+
+def write_file(path: Path, data: bytes) -> None:
+    # NOTE: plain os.write skips the TextIOWrapper and buffering layers
+    # which only get in the way when the whole file is already in memory;
+    # the output can be a hard link to an asset, so we never write in place
+    tmp_path = os.path.join(
+        os.path.dirname(path),
+        f'.{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp',
+    )
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view) :]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def has_content(path: Path, data: bytes) -> bool:
+    # NOTE: the size check is a single stat and rules out most changed
+    # files before we have to read anything
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, 'rb') as file:
+            return file.read() == data
+    except OSError:
+        return False
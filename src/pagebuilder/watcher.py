@@ -1,21 +1,35 @@
 import logging
-import shutil
+import os
+import queue
+import re
+import threading
+import time
+from collections.abc import Callable
 from os import PathLike
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 from watchdog.events import (
+    EVENT_TYPE_CLOSED,
+    EVENT_TYPE_CREATED,
+    EVENT_TYPE_DELETED,
+    EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_MOVED,
     DirCreatedEvent,
     DirDeletedEvent,
     DirModifiedEvent,
     DirMovedEvent,
+    FileClosedEvent,
     FileCreatedEvent,
     FileDeletedEvent,
     FileModifiedEvent,
     FileMovedEvent,
+    FileSystemEvent,
     FileSystemEventHandler,
 )
 
+from .utils import copy_asset, is_same_file_state
+
 type StrPath = PathLike[str] | str
 
 if TYPE_CHECKING:
@@ -24,16 +38,170 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger('pagebuilder')
 
+DEBOUNCE_DELAY = 0.05
+BATCH_MAX_DELAY = 0.5
+DEBOUNCED_EVENT_TYPES = {
+    EVENT_TYPE_CLOSED,
+    EVENT_TYPE_CREATED,
+    EVENT_TYPE_DELETED,
+    EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_MOVED,
+}
+
+# NOTE: swap, backup and lock files editors keep next to the files
+# they edit (vim, emacs, jetbrains), handling them is wasted work at best
+EDITOR_FILE_RE = re.compile(r'(\.sw[a-p]|~|___jb_(tmp|old)___)$|^(\.?#|4913$)')
+# NOTE: build() copies every asset, so for assets only the files an editor
+# creates and removes by itself are ignored, backups and the like are not
+EDITOR_TEMP_FILE_RE = re.compile(
+    r'^(\..+\.sw[a-p]|\.#.*|#.*#|4913)$|___jb_(tmp|old)___$'
+)
+
+# NOTE: directory events and the open and read events aren't used by any
+# handler, so there is no point in having the observer report them
+WATCHED_EVENTS: list[type[FileSystemEvent]] = [
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent,
+]
+# inotify fires a modify event for every write call,
+# a closed event only comes once the writer is done with the file
+INOTIFY_WATCHED_EVENTS: list[type[FileSystemEvent]] = [
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileClosedEvent,
+    FileMovedEvent,
+]
+
+# NOTE: every handler drains its events on its own thread, this keeps them
+# running one at a time like on the single watchdog dispatcher thread
+_handle_lock = threading.Lock()
+
+
+def _batch_key(event: FileSystemEvent) -> str | tuple[str, str]:
+    # a move also creates its destination, so a later event
+    # for the source path must not replace it
+    if event.event_type == EVENT_TYPE_MOVED:
+        return str(event.src_path), str(event.dest_path)
+    return str(event.src_path)
+
+
+class _EventBatcher:
+    def __init__(self, handle: Callable[[FileSystemEvent], None]) -> None:
+        self._handle = handle
+        # None is queued by stop() to end the thread
+        self._queue: queue.Queue[FileSystemEvent | None] = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, event: FileSystemEvent) -> None:
+        self._queue.put(event)
+
+    def stop(self) -> None:
+        # events queued before stop are still handled before it returns
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._handle_batch(self._collect_batch())
+
+    def _collect_batch(self) -> list[FileSystemEvent]:
+        # NOTE: editors fire a few events for a single save, so we wait
+        # until the events stop for a bit and only keep the last event
+        # for each path; a path that never stops changing still gets
+        # handled every BATCH_MAX_DELAY seconds
+        batch: dict[str | tuple[str, str], FileSystemEvent] = {}
+        event = self._queue.get()
+        if event is None:
+            self._stopped = True
+            return []
+        batch[_batch_key(event)] = event
+        deadline = time.monotonic() + BATCH_MAX_DELAY
+        while True:
+            timeout = min(DEBOUNCE_DELAY, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                event = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if event is None:
+                self._stopped = True
+                break
+            key = _batch_key(event)
+            # move the key to the end so events keep their latest order
+            batch.pop(key, None)
+            batch[key] = event
+        return list(batch.values())
+
+    def _handle_batch(self, batch: list[FileSystemEvent]) -> None:
+        for event in batch:
+            # NOTE: an exception here would kill the thread
+            # and every later event would be lost with it
+            try:
+                self._handle(event)
+            except Exception as err:
+                logger.error(
+                    f'failed to handle event: {event.src_path}; {err!r}'
+                )
+
 
 class WatcherFileSystemEventHandler(FileSystemEventHandler):
+    # handlers that touch the builder pages and templates have to run
+    # one at a time, the ones that don't can overlap with them
+    serialized = True
+
     def __init__(self, generator: 'PageBuilder') -> None:
         super().__init__()
         self.builder = generator
+        self._batcher = _EventBatcher(self._dispatch_batched)
+
+    def stop(self) -> None:
+        self._batcher.stop()
+
+    def dispatch(self, event: FileSystemEvent) -> None:
+        if event.event_type not in DEBOUNCED_EVENT_TYPES:
+            super().dispatch(event)
+            return
+        if not event.is_directory:
+            event = self.filter_event(event)
+            if event is None:
+                return
+        self._batcher.put(event)
+
+    def filter_event(self, event: FileSystemEvent) -> FileSystemEvent | None:
+        if event.event_type != EVENT_TYPE_MOVED:
+            return None if self.is_ignored(str(event.src_path)) else event
+        # a move between an ignored and a watched file
+        # is a create or a delete as far as we are concerned
+        src_ignored = self.is_ignored(str(event.src_path))
+        dest_ignored = self.is_ignored(str(event.dest_path))
+        if src_ignored and dest_ignored:
+            return None
+        if src_ignored:
+            return FileCreatedEvent(event.dest_path, is_synthetic=True)
+        if dest_ignored:
+            return FileDeletedEvent(event.src_path, is_synthetic=True)
+        return event
+
+    def is_ignored(self, path: str) -> bool:
+        return bool(EDITOR_FILE_RE.search(os.path.basename(path)))
+
+    def _dispatch_batched(self, event: FileSystemEvent) -> None:
+        if not self.serialized:
+            super().dispatch(event)
+            return
+        with _handle_lock:
+            super().dispatch(event)
 
     def on_created_or_modified(
         self,
         event: FileCreatedEvent
         | FileModifiedEvent
+        | FileClosedEvent
         | DirCreatedEvent
         | DirModifiedEvent,
     ) -> None:
@@ -59,12 +227,19 @@ class WatcherFileSystemEventHandler(FileSystemEventHandler):
     def on_modified(self, event: DirModifiedEvent | FileModifiedEvent) -> None:
         self.on_created_or_modified(event)
 
+    def on_closed(self, event: FileClosedEvent) -> None:
+        self.on_created_or_modified(event)
+
 
 class PagesHandler(WatcherFileSystemEventHandler):
+    def is_ignored(self, path: str) -> bool:
+        return not path.endswith(self.builder.ext) or super().is_ignored(path)
+
     def on_created_or_modified(
         self,
         event: FileCreatedEvent
         | FileModifiedEvent
+        | FileClosedEvent
         | DirCreatedEvent
         | DirModifiedEvent,
     ) -> None:
@@ -83,21 +258,42 @@ class PagesHandler(WatcherFileSystemEventHandler):
         except Exception as err:
             logger.error(err.args[0])
 
+    def on_moved(self, event: DirMovedEvent | FileMovedEvent) -> None:
+        if event.is_directory:
+            super().on_moved(event)
+            return
+
+        src_path = Path(str(event.src_path))
+        dest_path = Path(str(event.dest_path))
+        logger.info(f'page moved: {src_path} -> {dest_path}')
+        try:
+            page = self.builder.move_page(src_path, dest_path)
+            page.save()
+        except Exception as err:
+            logger.error(err.args[0])
+
     def on_deleted(self, event: DirDeletedEvent | FileDeletedEvent) -> None:
         if event.is_directory:
             return
 
         path = Path(str(event.src_path))
-        page = self.builder.pages.pop(path)
-        page.save_path.unlink()
+        # temporary files editors save through were never loaded
+        if path not in self.builder.pages:
+            return
+        page = self.builder.remove_page(path)
+        page.save_path.unlink(missing_ok=True)
         logger.info(f'page deleted: {path}')
 
 
 class TemplateHandler(WatcherFileSystemEventHandler):
+    def is_ignored(self, path: str) -> bool:
+        return not path.endswith(self.builder.ext) or super().is_ignored(path)
+
     def on_created_or_modified(
         self,
         event: FileCreatedEvent
         | FileModifiedEvent
+        | FileClosedEvent
         | DirCreatedEvent
         | DirModifiedEvent,
     ) -> None:
@@ -105,11 +301,41 @@ class TemplateHandler(WatcherFileSystemEventHandler):
             return
 
         path = Path(str(event.src_path))
+        name = path.name.removesuffix(self.builder.ext)
+        old_template = self.builder.templates.get(name)
+        old_parent = (
+            old_template.data.get('template') if old_template else None
+        )
         template = self.builder.add_template(path)
+        if template is old_template:
+            return
         logger.info(f'template changed: {path}')
-        for page in self.builder.pages.values():
-            if template.name in page.template_stack:
-                page.save()
+        # NOTE: template stacks are computed once when the page is loaded,
+        # so if the template now extends another template we refresh them
+        parent_changed = old_parent != template.data.get('template')
+        page_paths = list(self.builder.pages_by_template[template.name])
+        if parent_changed:
+            for page_path in page_paths:
+                self.builder.refresh_template_stack(page_path)
+        self.builder.save_pages(page_paths)
+
+    def on_moved(self, event: DirMovedEvent | FileMovedEvent) -> None:
+        if event.is_directory:
+            super().on_moved(event)
+            return
+
+        # NOTE: pages refer to templates by name, so when the name stays
+        # the same the move is just a change of the template at the new path
+        src_path = Path(str(event.src_path))
+        dest_path = Path(str(event.dest_path))
+        ext = self.builder.ext
+        if src_path.name.removesuffix(ext) != dest_path.name.removesuffix(ext):
+            self.on_deleted(
+                FileDeletedEvent(event.src_path, is_synthetic=True)
+            )
+        self.on_created_or_modified(
+            FileCreatedEvent(event.dest_path, is_synthetic=True)
+        )
 
     def on_deleted(self, event: DirDeletedEvent | FileDeletedEvent) -> None:
         if event.is_directory:
@@ -117,24 +343,46 @@ class TemplateHandler(WatcherFileSystemEventHandler):
 
         path = Path(str(event.src_path))
         name = path.name.removesuffix(self.builder.ext)
-        del self.builder.templates[name]
+        template = self.builder.templates.get(name)
+        if template is None or template.source_path != path:
+            return
+        self.builder.remove_template(name)
         logger.info(f'template deleted: {path}')
 
 
 class AssetHandler(WatcherFileSystemEventHandler):
-    def to_real_path(self, path: Path) -> Path:
-        if not self.builder.assets_path:
+    # assets are copied file by file and never touch pages or templates
+    serialized = False
+
+    def is_ignored(self, path: str) -> bool:
+        return bool(EDITOR_TEMP_FILE_RE.search(os.path.basename(path)))
+
+    def __init__(self, generator: 'PageBuilder') -> None:
+        if not generator.assets_path:
             raise ValueError(
                 'an AssetHandler was created and scheduled without assets_path'
             )
-        return self.builder.dist_path / path.relative_to(
-            self.builder.assets_path
+        super().__init__(generator)
+        # NOTE: event paths always start with the watched path,
+        # so a slice and a join are enough to map them to the output
+        self._assets_prefix = os.path.join(generator.assets_path, '')
+        self._assets_root = generator.assets_path.resolve()
+        self._dist_prefix = os.path.join(generator.dist_path, '')
+
+    def to_real_path(self, path: StrPath) -> Path:
+        path = os.fspath(path)
+        if path.startswith(self._assets_prefix):
+            return Path(self._dist_prefix + path[len(self._assets_prefix) :])
+        # some backends (fsevents) report resolved absolute paths
+        return self.builder.dist_path / Path(path).resolve().relative_to(
+            self._assets_root
         )
 
     def on_created_or_modified(
         self,
         event: FileCreatedEvent
         | FileModifiedEvent
+        | FileClosedEvent
         | DirCreatedEvent
         | DirModifiedEvent,
     ) -> None:
@@ -143,14 +391,46 @@ class AssetHandler(WatcherFileSystemEventHandler):
 
         path = Path(str(event.src_path))
         real_path = self.to_real_path(path)
-        real_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(path, real_path)
+        # a copy keeps the mtime of the asset, so a copy that matches
+        # is current and the event didn't change the contents
+        if is_same_file_state(path, real_path):
+            logger.debug(f'asset unchanged; skipping: {path}')
+            return
+        self.builder.make_dir(real_path.parent)
+        try:
+            copy_asset(path, real_path, link=self.builder.link_assets)
+        except FileNotFoundError:
+            # the output directory was removed since we made it
+            self.builder.make_dir(real_path.parent, force=True)
+            copy_asset(path, real_path, link=self.builder.link_assets)
         logger.info(f'asset copied: {path}')
 
+    def on_moved(self, event: DirMovedEvent | FileMovedEvent) -> None:
+        if event.is_directory:
+            super().on_moved(event)
+            return
+
+        src_path = Path(str(event.src_path))
+        dest_path = Path(str(event.dest_path))
+        real_path = self.to_real_path(dest_path)
+        # NOTE: the output is a copy of the moved file, so we move it as well
+        # and only copy when it doesn't match the file anymore
+        self.builder.make_dir(real_path.parent)
+        try:
+            os.replace(self.to_real_path(src_path), real_path)
+        except FileNotFoundError:
+            pass
+        if is_same_file_state(dest_path, real_path):
+            logger.info(f'asset moved: {src_path} -> {dest_path}')
+            return
+        self.on_created_or_modified(
+            FileCreatedEvent(event.dest_path, is_synthetic=True)
+        )
+
     def on_deleted(self, event: DirDeletedEvent | FileDeletedEvent) -> None:
         if event.is_directory:
             return
 
         path = Path(str(event.src_path))
-        self.to_real_path(path).unlink()
+        self.to_real_path(path).unlink(missing_ok=True)
         logger.info(f'asset deleted: {path}')